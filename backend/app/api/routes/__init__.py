@@ -1,15 +1,36 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import Optional
+import uuid
 
 # Create main API router
 api_router = APIRouter()
 
+class Position(BaseModel):
+    """Mindmap position of a sticky."""
+    x: float
+    y: float
+
+class BranchRequest(BaseModel):
+    """Branch creation request, mirroring BranchRequestSchema in shared types."""
+    branch_id: Optional[str] = Field(default=None, alias="branchId")
+    selected_text: str = Field(alias="selectedText")
+    source_message_id: str = Field(alias="sourceMessageId")
+    source_thread_id: str = Field(alias="sourceThreadId")
+    new_query: str = Field(alias="newQuery")
+    position: Position
+
 @api_router.get("/health")
-async def health_check():
-    """Health check endpoint."""
+async def health_check(request: Request):
+    """Health check endpoint, reporting degraded status when the vector store is failing."""
+    vector_store = getattr(request.app.state, "vector_store", None)
+    vector_store_health = vector_store.health() if vector_store else {"status": "unavailable"}
+    
     return {
-        "status": "healthy",
+        "status": "healthy" if vector_store_health["status"] == "healthy" else "degraded",
         "message": "Entropy API is running",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "vector_store": vector_store_health
     }
 
 @api_router.get("/")
@@ -19,4 +40,46 @@ async def root():
         "message": "Welcome to Entropy API",
         "docs": "/docs",
         "health": "/api/v1/health"
-    } 
\ No newline at end of file
+    }
+
+@api_router.post("/branches")
+async def create_branch(branch: BranchRequest, request: Request):
+    """Create a branch and start prefetching its context for the first chat turn.
+    
+    Clients that create branch ids themselves should send them as `branchId`;
+    otherwise one is generated. The prefetched context is keyed by the returned
+    `branchId`, which the first chat turn must pass to `generate_response`.
+    """
+    branch_id = branch.branch_id or str(uuid.uuid4())
+    
+    branch_prefetch = getattr(request.app.state, "branch_prefetch", None)
+    if branch_prefetch:
+        branch_prefetch.schedule(
+            branch_id,
+            selected_text=branch.selected_text,
+            source_thread_id=branch.source_thread_id,
+            new_query=branch.new_query
+        )
+    
+    return {
+        "branchId": branch_id,
+        "sourceThreadId": branch.source_thread_id,
+        "prefetching": branch_prefetch is not None
+    }
+
+@api_router.get("/branches/prefetch/stats")
+async def branch_prefetch_stats(request: Request):
+    """Prefetch hit-rate metrics."""
+    branch_prefetch = getattr(request.app.state, "branch_prefetch", None)
+    return branch_prefetch.get_stats() if branch_prefetch else {}
+
+@api_router.get("/branches/{branch_id}/context")
+async def branch_context_decisions(branch_id: str, request: Request):
+    """Packing decisions from the last context pack for a branch, for debugging."""
+    context_packer = getattr(request.app.state, "context_packer", None)
+    last_pack = context_packer.get_last_pack(branch_id) if context_packer else None
+    
+    if last_pack is None:
+        raise HTTPException(status_code=404, detail=f"No context packed for branch {branch_id}")
+    
+    return {"branchId": branch_id, **last_pack}
@@ -33,6 +33,21 @@ class Settings(BaseSettings):
     # Vector Database Settings
     WEAVIATE_URL: str = Field(default="http://localhost:8080", env="WEAVIATE_URL")
     WEAVIATE_API_KEY: Optional[str] = Field(default=None, env="WEAVIATE_API_KEY")
+    WEAVIATE_GRPC_PORT: int = Field(default=50051, env="WEAVIATE_GRPC_PORT")
+    WEAVIATE_POOL_CONNECTIONS: int = Field(default=10, env="WEAVIATE_POOL_CONNECTIONS")
+    WEAVIATE_POOL_MAXSIZE: int = Field(default=20, env="WEAVIATE_POOL_MAXSIZE")
+    WEAVIATE_EXECUTOR_WORKERS: int = Field(default=16, env="WEAVIATE_EXECUTOR_WORKERS")
+    WEAVIATE_KEEPALIVE_SECONDS: float = Field(default=30.0, env="WEAVIATE_KEEPALIVE_SECONDS")
+    WEAVIATE_INIT_TIMEOUT: float = Field(default=5.0, env="WEAVIATE_INIT_TIMEOUT")
+    WEAVIATE_READ_TIMEOUT: float = Field(default=3.0, env="WEAVIATE_READ_TIMEOUT")
+    WEAVIATE_WRITE_TIMEOUT: float = Field(default=10.0, env="WEAVIATE_WRITE_TIMEOUT")
+    WEAVIATE_READ_RETRIES: int = Field(default=2, env="WEAVIATE_READ_RETRIES")
+    WEAVIATE_RETRY_BACKOFF: float = Field(default=0.1, env="WEAVIATE_RETRY_BACKOFF")
+    WEAVIATE_HEDGE_DELAY: float = Field(default=0.15, env="WEAVIATE_HEDGE_DELAY")
+    WEAVIATE_HEDGE_BUDGET: float = Field(default=0.05, env="WEAVIATE_HEDGE_BUDGET")
+    WEAVIATE_HEDGE_BURST: float = Field(default=5.0, env="WEAVIATE_HEDGE_BURST")
+    WEAVIATE_BREAKER_FAILURES: int = Field(default=5, env="WEAVIATE_BREAKER_FAILURES")
+    WEAVIATE_BREAKER_RESET_SECONDS: float = Field(default=30.0, env="WEAVIATE_BREAKER_RESET_SECONDS")
     
     # LLM Provider Settings
     OPENAI_API_KEY: Optional[str] = Field(default=None, env="OPENAI_API_KEY")
@@ -51,6 +66,14 @@ class Settings(BaseSettings):
     # RAG Configuration
     SIMILARITY_THRESHOLD: float = Field(default=0.7, env="SIMILARITY_THRESHOLD")
     MAX_CONTEXT_TOKENS: int = Field(default=8000, env="MAX_CONTEXT_TOKENS")
+    CONTEXT_TOKEN_CACHE_SIZE: int = Field(default=4096, env="CONTEXT_TOKEN_CACHE_SIZE")
+    CONTEXT_BRANCH_STATE_SIZE: int = Field(default=1024, env="CONTEXT_BRANCH_STATE_SIZE")
+    
+    # Branch Prefetch Configuration
+    BRANCH_PREFETCH_TTL_SECONDS: float = Field(default=120.0, env="BRANCH_PREFETCH_TTL_SECONDS")
+    BRANCH_PREFETCH_WAIT_SECONDS: float = Field(default=2.0, env="BRANCH_PREFETCH_WAIT_SECONDS")
+    BRANCH_PREFETCH_MAX_SLOTS: int = Field(default=256, env="BRANCH_PREFETCH_MAX_SLOTS")
+    BRANCH_PREFETCH_SEARCH_LIMIT: int = Field(default=10, env="BRANCH_PREFETCH_SEARCH_LIMIT")
     
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = Field(default=100, env="RATE_LIMIT_REQUESTS")
@@ -0,0 +1,160 @@
+"""
+Speculative context prefetch for newly created branches.
+"""
+
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+import asyncio
+from loguru import logger
+
+from app.config import settings
+from app.services.vector_store import VectorStoreService
+from app.services.context_packer import ContextPacker
+
+class BranchPrefetchService:
+    """Service for warming a branch's RAG context before its first chat turn.
+
+    When a branch is created, the similarity search and ancestry lookup run in
+    the background and the packed context is parked in a short-lived slot. The
+    first `take` for the branch consumes the slot, waiting on the prefetch if
+    it is still in flight.
+    """
+
+    def __init__(self, vector_store: VectorStoreService, context_packer: ContextPacker):
+        self.vector_store = vector_store
+        self.context_packer = context_packer
+        self.ttl = settings.BRANCH_PREFETCH_TTL_SECONDS
+        self.max_slots = settings.BRANCH_PREFETCH_MAX_SLOTS
+
+        # branch_id -> (prefetch task, expiry timer), oldest first
+        self._slots: "OrderedDict[str, Any]" = OrderedDict()
+
+        self.metrics = {
+            "scheduled": 0,
+            "hits": 0,
+            "in_flight_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "failed": 0,
+            "evicted": 0,
+        }
+
+    def schedule(
+        self,
+        branch_id: str,
+        selected_text: str,
+        source_thread_id: str,
+        new_query: str
+    ):
+        """Start prefetching context for a new branch."""
+        previous = self._slots.pop(branch_id, None)
+        if previous is not None:
+            self._discard(previous)
+            self.metrics["evicted"] += 1
+
+        while len(self._slots) >= self.max_slots:
+            _, slot = self._slots.popitem(last=False)
+            self._discard(slot)
+            self.metrics["evicted"] += 1
+
+        task = asyncio.create_task(
+            self._prefetch(branch_id, selected_text, source_thread_id, new_query)
+        )
+        timer = asyncio.get_running_loop().call_later(self.ttl, self._expire, branch_id, task)
+        self._slots[branch_id] = (task, timer)
+        self.metrics["scheduled"] += 1
+
+    async def _prefetch(
+        self,
+        branch_id: str,
+        selected_text: str,
+        source_thread_id: str,
+        new_query: str
+    ) -> Optional[Dict[str, Any]]:
+        """Run the similarity search and ancestry lookup, then pack the context."""
+        try:
+            query_text = f"{selected_text} {new_query}".strip()
+            hits, ancestors = await asyncio.gather(
+                self.vector_store.search_similar(
+                    query_text,
+                    limit=settings.BRANCH_PREFETCH_SEARCH_LIMIT,
+                    similarity_threshold=settings.SIMILARITY_THRESHOLD
+                ),
+                self.vector_store.get_thread_ancestors(source_thread_id)
+            )
+
+            packed = self.context_packer.pack(hits, ancestors, branch_id=branch_id)
+            logger.debug(f"Prefetched context for branch {branch_id}: {packed['tokens_used']} tokens")
+            return packed
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Failed to prefetch context for branch {branch_id}: {e}")
+            return None
+
+    @staticmethod
+    def _discard(slot):
+        """Cancel a slot's prefetch and its expiry timer."""
+        task, timer = slot
+        timer.cancel()
+        task.cancel()
+
+    def _expire(self, branch_id: str, task: asyncio.Task):
+        """Drop a slot whose TTL has passed without it being taken."""
+        slot = self._slots.get(branch_id)
+        if slot is not None and slot[0] is task:
+            del self._slots[branch_id]
+            task.cancel()
+            self.metrics["expired"] += 1
+
+    async def take(self, branch_id: str) -> Optional[Dict[str, Any]]:
+        """Consume the prefetched context for a branch, if any."""
+        slot = self._slots.pop(branch_id, None)
+
+        if slot is None:
+            self.metrics["misses"] += 1
+            return None
+
+        task, timer = slot
+        timer.cancel()
+        if task.cancelled():
+            self.metrics["failed"] += 1
+            return None
+
+        in_flight = not task.done()
+
+        try:
+            packed = await asyncio.wait_for(task, timeout=settings.BRANCH_PREFETCH_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            packed = None
+
+        if packed is None:
+            self.metrics["failed"] += 1
+            return None
+
+        self.metrics["in_flight_hits" if in_flight else "hits"] += 1
+        return packed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prefetch hit-rate metrics.
+
+        `hit_rate` is the share of finished prefetches that were consumed,
+        so prefetches that expired or were evicted unused count against it.
+        `lookup_hit_rate` is the share of first turns that found context ready.
+        """
+        served = self.metrics["hits"] + self.metrics["in_flight_hits"]
+        resolved = served + self.metrics["failed"] + self.metrics["expired"] + self.metrics["evicted"]
+        lookups = served + self.metrics["misses"] + self.metrics["failed"]
+        return {
+            **self.metrics,
+            "pending_slots": len(self._slots),
+            "hit_rate": served / resolved if resolved else 0.0,
+            "lookup_hit_rate": served / lookups if lookups else 0.0,
+        }
+
+    async def close(self):
+        """Cancel outstanding prefetches."""
+        for slot in self._slots.values():
+            self._discard(slot)
+        self._slots.clear()
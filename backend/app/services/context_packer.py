@@ -0,0 +1,245 @@
+"""
+Context packer for assembling the RAG context passed to the LLM adapter.
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import tiktoken
+from loguru import logger
+
+from app.config import settings
+
+class ContextPacker:
+    """Service for packing retrieved stickies into a token-budgeted context string."""
+
+    # Fallback characters-per-token ratio when no tokenizer can be loaded
+    CHARS_PER_TOKEN = 4
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        similarity_threshold: Optional[float] = None,
+        cache_size: Optional[int] = None
+    ):
+        self.max_tokens = max_tokens or settings.MAX_CONTEXT_TOKENS
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None
+            else settings.SIMILARITY_THRESHOLD
+        )
+        self.cache_size = cache_size or settings.CONTEXT_TOKEN_CACHE_SIZE
+
+        # Loaded on first use: tiktoken downloads its BPE files on first load,
+        # which must not block or break startup
+        self._encoding = None
+        self._encoding_unavailable = False
+
+        # Token counts keyed by content hash, evicted least-recently-used first
+        self._token_cache: "OrderedDict[str, int]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Per-branch packing state, evicted least-recently-used first:
+        # the order stickies were first emitted in and the last pack's decisions
+        self._branches: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.branch_state_size = settings.CONTEXT_BRANCH_STATE_SIZE
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        """Hash block content so identical stickies share a cache entry."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _get_encoding(self):
+        """Load the tokenizer once, or return None if it cannot be loaded."""
+        if self._encoding is None and not self._encoding_unavailable:
+            try:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(settings.DEFAULT_MODEL)
+                except KeyError:
+                    # Non-OpenAI models have no registered encoding; cl100k is a close estimate
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"Failed to load tokenizer, estimating token counts from length: {e}")
+                self._encoding_unavailable = True
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens in a text, caching by content hash."""
+        key = self._hash(text)
+
+        if key in self._token_cache:
+            self._token_cache.move_to_end(key)
+            self.cache_hits += 1
+            return self._token_cache[key]
+
+        self.cache_misses += 1
+        encoding = self._get_encoding()
+        if encoding is not None:
+            tokens = len(encoding.encode(text, disallowed_special=()))
+        else:
+            tokens = -(-len(text) // self.CHARS_PER_TOKEN)
+
+        self._token_cache[key] = tokens
+        if len(self._token_cache) > self.cache_size:
+            self._token_cache.popitem(last=False)
+
+        return tokens
+
+    @staticmethod
+    def _render_block(sticky: Dict[str, Any], source: str) -> str:
+        """Render a sticky as a context block.
+
+        Scores are deliberately left out so the same sticky always renders to
+        the same text, keeping the prefix byte-identical across turns.
+        """
+        lines = [f"[{source}] {sticky.get('title') or ''}".rstrip()]
+        if sticky.get("content"):
+            lines.append(sticky["content"])
+        if sticky.get("query"):
+            lines.append(f"Q: {sticky['query']}")
+        if sticky.get("response"):
+            lines.append(f"A: {sticky['response']}")
+        return "\n".join(lines)
+
+    def _branch_state(self, branch_id: str) -> Dict[str, Any]:
+        """Get (or create) the packing state for a branch."""
+        state = self._branches.get(branch_id)
+        if state is None:
+            state = {"order": {}, "last_pack": None}
+            self._branches[branch_id] = state
+            if len(self._branches) > self.branch_state_size:
+                self._branches.popitem(last=False)
+        else:
+            self._branches.move_to_end(branch_id)
+        return state
+
+    def pack(
+        self,
+        hits: List[Dict[str, Any]],
+        ancestors: Optional[List[Dict[str, Any]]] = None,
+        max_tokens: Optional[int] = None,
+        branch_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Pack ancestors and similarity hits into a context string.
+
+        `hits` are results from `VectorStoreService.search_similar`; `ancestors`
+        are the branch's stickies ordered from root to nearest parent. Ancestors
+        are budgeted first (nearest parent first), then hits greedily by
+        similarity. The emitted context lists ancestors root-first, then hits in
+        the order they were first packed for `branch_id`, so a newly retrieved
+        hit is appended after the blocks earlier turns already sent.
+        """
+        budget = max_tokens or self.max_tokens
+        ancestors = ancestors or []
+
+        decisions: List[Dict[str, Any]] = []
+        seen: set = set()
+        used_tokens = 0
+        ancestor_blocks: List[str] = []
+        hit_blocks: Dict[str, str] = {}
+
+        def consider(
+            sticky: Dict[str, Any], source: str, score: Optional[float]
+        ) -> Optional[Tuple[str, str]]:
+            nonlocal used_tokens
+            sticky_id = sticky.get("sticky_id")
+            # Stickies without an id are identified by their content instead
+            key = sticky_id or self._hash(self._render_block(sticky, ""))
+            decision = {
+                "sticky_id": sticky_id,
+                "source": source,
+                "score": score,
+                "tokens": 0,
+                "included": False,
+                "reason": "packed",
+            }
+            decisions.append(decision)
+
+            if key in seen:
+                decision["reason"] = "duplicate"
+                return None
+            if score is not None and score < self.similarity_threshold:
+                decision["reason"] = "below_threshold"
+                return None
+
+            block = self._render_block(sticky, source)
+            tokens = self.count_tokens(block)
+            decision["tokens"] = tokens
+
+            if used_tokens + tokens > budget:
+                decision["reason"] = "over_budget"
+                return None
+
+            seen.add(key)
+            used_tokens += tokens
+            decision["included"] = True
+            return key, block
+
+        # Nearest parent gets first claim on the budget
+        for ancestor in reversed(ancestors):
+            packed = consider(ancestor, "Ancestor", None)
+            if packed is not None:
+                ancestor_blocks.insert(0, packed[1])
+
+        ranked_hits = sorted(
+            hits,
+            key=lambda h: (-(h.get("similarity") or 0.0), h.get("sticky_id") or "")
+        )
+        for hit in ranked_hits:
+            packed = consider(hit, "Related", hit.get("similarity"))
+            if packed is not None:
+                key, block = packed
+                hit_blocks[key] = block
+
+        if branch_id is not None:
+            state = self._branch_state(branch_id)
+            order = state["order"]
+            for key in hit_blocks:
+                order.setdefault(key, len(order))
+            hit_keys = sorted(hit_blocks, key=order.__getitem__)
+        else:
+            hit_keys = list(hit_blocks)
+
+        blocks = ancestor_blocks + [hit_blocks[key] for key in hit_keys]
+        context = "\n\n".join(blocks)
+
+        result = {
+            "context": context,
+            "tokens_used": used_tokens,
+            "max_tokens": budget,
+            "prefix_hash": self._hash(context),
+            "decisions": decisions,
+        }
+
+        logger.debug(
+            f"Packed {len(blocks)} stickies into {used_tokens}/{budget} tokens "
+            f"for branch {branch_id} ({sum(1 for d in decisions if not d['included'])} skipped)"
+        )
+        for decision in decisions:
+            logger.debug(
+                f"  {decision['source']} {decision['sticky_id']}: {decision['reason']} "
+                f"(score={decision['score']}, tokens={decision['tokens']})"
+            )
+
+        if branch_id is not None:
+            self._branch_state(branch_id)["last_pack"] = {
+                key: value for key, value in result.items() if key != "context"
+            }
+
+        return result
+
+    def get_last_pack(self, branch_id: str) -> Optional[Dict[str, Any]]:
+        """Get the decisions and token usage of the last pack for a branch."""
+        state = self._branches.get(branch_id)
+        return state["last_pack"] if state else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get token cache statistics."""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "entries": len(self._token_cache),
+            "capacity": self.cache_size,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+        }
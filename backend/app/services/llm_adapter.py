@@ -2,13 +2,17 @@
 LLM Adapter service for interfacing with different language model providers.
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
 from app.config import settings
 
+if TYPE_CHECKING:
+    from app.services.branch_prefetch import BranchPrefetchService
+
 class LLMAdapterService:
     """Service for interfacing with various LLM providers."""
     
-    def __init__(self):
+    def __init__(self, prefetcher: Optional["BranchPrefetchService"] = None):
+        self.prefetcher = prefetcher
         self.provider = settings.DEFAULT_LLM_PROVIDER
         self.model = settings.DEFAULT_MODEL
         
@@ -27,10 +31,17 @@ class LLMAdapterService:
         prompt: str, 
         context: Optional[str] = None,
         max_tokens: int = 1000,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        branch_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """Generate a response from the LLM."""
         
+        # Use context prefetched at branch creation when the caller has none
+        if context is None and branch_id and self.prefetcher:
+            packed = await self.prefetcher.take(branch_id)
+            if packed:
+                context = packed["context"]
+        
         if self.use_mock:
             # Return a mock response for testing
             return {
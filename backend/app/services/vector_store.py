@@ -1,53 +1,57 @@
-import weaviate
 from weaviate.classes.config import Configure, Property, DataType
 from weaviate.classes.query import Filter
 from typing import List, Dict, Any, Optional, Tuple
 from loguru import logger
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
 
 from app.config import settings
 from app.services.embedding import EmbeddingService
+from app.services.weaviate_connection import WeaviateConnection, VectorStoreUnavailableError, is_transient
 
 class VectorStoreService:
     """Service for managing vector storage and semantic search using Weaviate."""
     
     def __init__(self):
-        self.client: Optional[weaviate.WeaviateClient] = None
-        self.embedding_service = EmbeddingService()
-        self.executor = ThreadPoolExecutor(max_workers=4)
-        
         # Collection name for stickies
         self.collection_name = "StickyNote"
+        
+        self.connection = WeaviateConnection(keepalive_collection=self.collection_name)
+        self.embedding_service = EmbeddingService()
+    
+    @property
+    def client(self):
+        """The underlying Weaviate client, owned by the connection layer."""
+        return self.connection.client
+    
+    async def _read(self, operation: str, fn, hedge: bool = False):
+        """Run an idempotent read with deadline, jittered retries and optional hedging."""
+        return await self.connection.run(
+            operation,
+            fn,
+            timeout=settings.WEAVIATE_READ_TIMEOUT,
+            retries=settings.WEAVIATE_READ_RETRIES,
+            hedge=hedge
+        )
+    
+    async def _write(self, operation: str, fn):
+        """Run a write once with the write deadline."""
+        return await self.connection.run(operation, fn, timeout=settings.WEAVIATE_WRITE_TIMEOUT)
+    
+    @staticmethod
+    def _raise_if_unavailable(operation: str, error: Exception):
+        """Re-raise outages as VectorStoreUnavailableError instead of degrading to an empty result."""
+        if isinstance(error, VectorStoreUnavailableError):
+            raise error
+        if is_transient(error):
+            raise VectorStoreUnavailableError(f"{operation} failed: {error}") from error
+    
+    def health(self) -> Dict[str, Any]:
+        """Get vector store connection health."""
+        return self.connection.health()
     
     async def initialize(self):
         """Initialize the Weaviate client and create collections."""
         try:
-            # Parse Weaviate URL properly
-            from urllib.parse import urlparse
-            parsed_url = urlparse(settings.WEAVIATE_URL)
-            host = parsed_url.hostname or "localhost"
-            port = parsed_url.port or 8080
-            
-            logger.info(f"Connecting to Weaviate at {host}:{port}")
-            
-            # Create Weaviate client
-            if settings.WEAVIATE_API_KEY:
-                self.client = weaviate.connect_to_local(
-                    host=host,
-                    port=port,
-                    headers={"X-OpenAI-Api-Key": settings.OPENAI_API_KEY} if settings.OPENAI_API_KEY else None
-                )
-            else:
-                self.client = weaviate.connect_to_local(
-                    host=host,
-                    port=port,
-                    headers={"X-OpenAI-Api-Key": settings.OPENAI_API_KEY} if settings.OPENAI_API_KEY else None
-                )
-            
-            # Check if client is ready
-            if not self.client.is_ready():
-                raise ConnectionError("Weaviate client is not ready")
+            await self.connection.connect()
             
             # Create collection if it doesn't exist
             await self._create_collection()
@@ -62,12 +66,15 @@ class VectorStoreService:
         """Create the StickyNote collection with proper schema."""
         try:
             # Check if collection exists
-            if self.client.collections.exists(self.collection_name):
+            exists = await self._read(
+                "collection_exists", lambda: self.client.collections.exists(self.collection_name)
+            )
+            if exists:
                 logger.info(f"Collection {self.collection_name} already exists")
                 return
             
             # Create collection with schema
-            collection = self.client.collections.create(
+            await self._write("create_collection", lambda: self.client.collections.create(
                 name=self.collection_name,
                 properties=[
                     Property(name="sticky_id", data_type=DataType.TEXT),
@@ -85,7 +92,7 @@ class VectorStoreService:
                 vectorizer_config=Configure.Vectorizer.none() if settings.EMBEDDING_PROVIDER == "custom" 
                 else Configure.Vectorizer.text2vec_openai(model=settings.EMBEDDING_MODEL) if settings.EMBEDDING_PROVIDER == "openai"
                 else Configure.Vectorizer.text2vec_huggingface(model=settings.EMBEDDING_MODEL)
-            )
+            ))
             
             logger.info(f"Created collection {self.collection_name}")
             
@@ -127,17 +134,20 @@ class VectorStoreService:
             collection = self.client.collections.get(self.collection_name)
             
             if settings.EMBEDDING_PROVIDER == "custom":
-                uuid = collection.data.insert(
+                uuid = await self._write("add_sticky", lambda: collection.data.insert(
                     properties=data_object,
                     vector=embedding
-                )
+                ))
             else:
-                uuid = collection.data.insert(properties=data_object)
+                uuid = await self._write(
+                    "add_sticky", lambda: collection.data.insert(properties=data_object)
+                )
             
             logger.debug(f"Added sticky {sticky_id} to vector store with UUID {uuid}")
             return True
             
         except Exception as e:
+            self._raise_if_unavailable("add_sticky", e)
             logger.error(f"Failed to add sticky to vector store: {e}")
             return False
     
@@ -170,21 +180,21 @@ class VectorStoreService:
             
             # Perform vector search
             if settings.EMBEDDING_PROVIDER == "custom":
-                response = collection.query.near_vector(
+                response = await self._read("search_similar", lambda: collection.query.near_vector(
                     near_vector=query_embedding,
                     limit=limit,
                     distance=1 - similarity_threshold,  # Weaviate uses distance, not similarity
                     where=where_filter,
                     return_metadata=["distance"]
-                )
+                ), hedge=True)
             else:
-                response = collection.query.near_text(
+                response = await self._read("search_similar", lambda: collection.query.near_text(
                     query=query_text,
                     limit=limit,
                     distance=1 - similarity_threshold,
                     where=where_filter,
                     return_metadata=["distance"]
-                )
+                ), hedge=True)
             
             # Process results
             results = []
@@ -215,6 +225,7 @@ class VectorStoreService:
             return results
             
         except Exception as e:
+            self._raise_if_unavailable("search_similar", e)
             logger.error(f"Failed to search similar stickies: {e}")
             return []
     
@@ -232,10 +243,10 @@ class VectorStoreService:
             collection = self.client.collections.get(self.collection_name)
             
             # Find the object by sticky_id
-            search_result = collection.query.fetch_objects(
+            search_result = await self._read("fetch_sticky", lambda: collection.query.fetch_objects(
                 where=Filter.by_property("sticky_id").equal(sticky_id),
                 limit=1
-            )
+            ), hedge=True)
             
             if not search_result.objects:
                 logger.warning(f"Sticky {sticky_id} not found for update")
@@ -271,27 +282,28 @@ class VectorStoreService:
                 
                 if settings.EMBEDDING_PROVIDER == "custom":
                     # Update with new vector
-                    collection.data.update(
+                    await self._write("update_sticky", lambda: collection.data.update(
                         uuid=obj.uuid,
                         properties=update_data,
                         vector=embedding
-                    )
+                    ))
                 else:
-                    collection.data.update(
+                    await self._write("update_sticky", lambda: collection.data.update(
                         uuid=obj.uuid,
                         properties=update_data
-                    )
+                    ))
             else:
                 # Update without changing vector
-                collection.data.update(
+                await self._write("update_sticky", lambda: collection.data.update(
                     uuid=obj.uuid,
                     properties=update_data
-                )
+                ))
             
             logger.debug(f"Updated sticky {sticky_id} in vector store")
             return True
             
         except Exception as e:
+            self._raise_if_unavailable("update_sticky", e)
             logger.error(f"Failed to update sticky in vector store: {e}")
             return False
     
@@ -301,34 +313,47 @@ class VectorStoreService:
             collection = self.client.collections.get(self.collection_name)
             
             # Find and delete the object
-            search_result = collection.query.fetch_objects(
+            search_result = await self._read("fetch_sticky", lambda: collection.query.fetch_objects(
                 where=Filter.by_property("sticky_id").equal(sticky_id),
                 limit=1
-            )
+            ), hedge=True)
             
             if not search_result.objects:
                 logger.warning(f"Sticky {sticky_id} not found for deletion")
                 return False
             
             obj = search_result.objects[0]
-            collection.data.delete_by_id(obj.uuid)
+            await self._write("delete_sticky", lambda: collection.data.delete_by_id(obj.uuid))
             
             logger.debug(f"Deleted sticky {sticky_id} from vector store")
             return True
             
         except Exception as e:
+            self._raise_if_unavailable("delete_sticky", e)
             logger.error(f"Failed to delete sticky from vector store: {e}")
             return False
     
     async def get_sticky_by_id(self, sticky_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve a sticky note by its ID."""
+        return await self._get_sticky_where("sticky_id", sticky_id)
+    
+    async def get_sticky_by_branch(self, branch_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieve the sticky note for a branch.
+        
+        Each sticky fronts one conversation thread, and the thread id is what
+        is stored in the `branch_id` property.
+        """
+        return await self._get_sticky_where("branch_id", branch_id)
+    
+    async def _get_sticky_where(self, property_name: str, value: str) -> Optional[Dict[str, Any]]:
+        """Retrieve the first sticky note whose property equals the given value."""
         try:
             collection = self.client.collections.get(self.collection_name)
             
-            search_result = collection.query.fetch_objects(
-                where=Filter.by_property("sticky_id").equal(sticky_id),
+            search_result = await self._read("fetch_sticky", lambda: collection.query.fetch_objects(
+                where=Filter.by_property(property_name).equal(value),
                 limit=1
-            )
+            ), hedge=True)
             
             if not search_result.objects:
                 return None
@@ -355,11 +380,35 @@ class VectorStoreService:
             }
             
         except Exception as e:
-            logger.error(f"Failed to get sticky by ID: {e}")
+            self._raise_if_unavailable("get_sticky", e)
+            logger.error(f"Failed to get sticky by {property_name}: {e}")
             return None
     
+    async def get_ancestors(self, sticky_id: str, max_depth: int = 10) -> List[Dict[str, Any]]:
+        """Walk parent_id links from a sticky up to its root, returned root first."""
+        ancestors = []
+        seen = set()
+        current_id = sticky_id
+        
+        while current_id and current_id not in seen and len(ancestors) < max_depth:
+            seen.add(current_id)
+            sticky = await self.get_sticky_by_id(current_id)
+            if sticky is None:
+                break
+            ancestors.append(sticky)
+            current_id = sticky.get("parent_id")
+        
+        ancestors.reverse()
+        return ancestors
+    
+    async def get_thread_ancestors(self, thread_id: str, max_depth: int = 10) -> List[Dict[str, Any]]:
+        """Resolve a thread to its sticky and return that sticky's ancestry, root first."""
+        sticky = await self.get_sticky_by_branch(thread_id)
+        if sticky is None:
+            return []
+        return await self.get_ancestors(sticky["sticky_id"], max_depth=max_depth)
+    
     async def close(self):
         """Close the vector store connection."""
-        if self.client:
-            self.client.close()
-            logger.info("Vector store connection closed") 
\ No newline at end of file
+        await self.connection.close()
+        logger.info("Vector store connection closed") 
\ No newline at end of file
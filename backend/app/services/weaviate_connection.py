@@ -0,0 +1,389 @@
+"""
+Resilient connection layer for Weaviate: pooled client, deadlines, retries,
+hedged reads and a circuit breaker.
+"""
+
+from typing import Any, Callable, Dict, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import asyncio
+import math
+import random
+import threading
+import time
+
+import grpc
+import httpx
+import weaviate
+from weaviate.auth import AuthApiKey
+from weaviate.config import AdditionalConfig, ConnectionConfig, Timeout
+from weaviate.exceptions import UnexpectedStatusCodeError
+from loguru import logger
+
+from app.config import settings
+
+T = TypeVar("T")
+
+TRANSIENT_GRPC_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+}
+
+class VectorStoreUnavailableError(Exception):
+    """Raised when Weaviate is unreachable or overloaded: the circuit is open,
+    or a call failed transiently after its retries."""
+
+def is_transient(error: BaseException) -> bool:
+    """Check whether an error signals an unreachable or overloaded server.
+
+    Timeouts, connection errors, 5xx/429 responses and UNAVAILABLE-style gRPC
+    statuses are transient. Anything else (bad filters, 4xx/422) means the
+    server answered, so it is neither retried nor counted by the breaker. The
+    client wraps transport errors, so the cause chain is searched too.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError, OSError, httpx.TransportError)):
+            return True
+        if isinstance(error, UnexpectedStatusCodeError):
+            return error.status_code >= 500 or error.status_code == 429
+        if isinstance(error, grpc.RpcError) and callable(getattr(error, "code", None)):
+            return error.code() in TRANSIENT_GRPC_CODES
+        error = error.__cause__ or error.__context__
+    return False
+
+def _require_ready(ready: bool) -> bool:
+    """Turn a falsy `is_ready()` into an error; the client reports outages that way instead of raising."""
+    if not ready:
+        raise ConnectionError("Weaviate reported not ready")
+    return ready
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker that lets a single probe through when half-open."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Check whether a call may proceed.
+
+        Once the reset timeout passes the circuit goes half-open and exactly
+        one caller is let through as a probe; everyone else is refused until
+        the probe records its outcome.
+        """
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            logger.info("Weaviate circuit half-open, probing")
+
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    @property
+    def is_healthy(self) -> bool:
+        """Closed with no failures since the last success."""
+        return self.state == self.CLOSED and self.consecutive_failures == 0
+
+    def record_success(self):
+        """Record a successful call, closing the circuit."""
+        if self.state != self.CLOSED:
+            logger.info("Weaviate circuit closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self, error: BaseException):
+        """Record a failed call, opening the circuit past the threshold."""
+        self.consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    f"Weaviate circuit opened after {self.consecutive_failures} failures: {self.last_error}"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def abandon(self):
+        """Release a half-open probe whose caller went away without an outcome."""
+        self._probe_in_flight = False
+
+    def status(self) -> Dict[str, Any]:
+        """Get the breaker state for health reporting."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+class WeaviateConnection:
+    """Owns the Weaviate client and runs every call through deadlines and the breaker.
+
+    The v4 client is synchronous, so calls are dispatched to a bounded thread
+    pool; a deadline stops the caller waiting but cannot interrupt the worker
+    thread, which is why the pool is sized separately from the HTTP pool.
+    """
+
+    def __init__(self, keepalive_collection: Optional[str] = None):
+        self.client: Optional[weaviate.WeaviateClient] = None
+        self.keepalive_collection = keepalive_collection
+        self.workers = settings.WEAVIATE_EXECUTOR_WORKERS
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="weaviate"
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.WEAVIATE_BREAKER_FAILURES,
+            reset_timeout=settings.WEAVIATE_BREAKER_RESET_SECONDS
+        )
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+        # Calls submitted to the pool and not yet finished, including ones
+        # whose caller already gave up
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+        # Hedge budget: each hedgeable read earns WEAVIATE_HEDGE_BUDGET tokens,
+        # each hedge spends one
+        self._hedge_tokens = settings.WEAVIATE_HEDGE_BURST
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.hedges_skipped = 0
+
+    def _build_client(self) -> weaviate.WeaviateClient:
+        """Create the client with explicit pool sizing and timeouts."""
+        parsed_url = urlparse(settings.WEAVIATE_URL)
+        host = parsed_url.hostname or "localhost"
+        secure = parsed_url.scheme == "https"
+        port = parsed_url.port or (443 if secure else 8080)
+
+        logger.info(
+            f"Connecting to Weaviate at {host}:{port} (gRPC {settings.WEAVIATE_GRPC_PORT})"
+        )
+
+        return weaviate.connect_to_custom(
+            http_host=host,
+            http_port=port,
+            http_secure=secure,
+            grpc_host=host,
+            grpc_port=settings.WEAVIATE_GRPC_PORT,
+            grpc_secure=secure,
+            headers={"X-OpenAI-Api-Key": settings.OPENAI_API_KEY} if settings.OPENAI_API_KEY else None,
+            auth_credentials=AuthApiKey(settings.WEAVIATE_API_KEY) if settings.WEAVIATE_API_KEY else None,
+            additional_config=AdditionalConfig(
+                connection=ConnectionConfig(
+                    session_pool_connections=settings.WEAVIATE_POOL_CONNECTIONS,
+                    session_pool_maxsize=settings.WEAVIATE_POOL_MAXSIZE,
+                    # Retries are handled here, with jitter and breaker accounting
+                    session_pool_max_retries=0,
+                ),
+                # The client only takes whole seconds; the fractional deadlines
+                # are enforced by run()
+                timeout=Timeout(
+                    init=math.ceil(settings.WEAVIATE_INIT_TIMEOUT),
+                    query=math.ceil(settings.WEAVIATE_READ_TIMEOUT),
+                    insert=math.ceil(settings.WEAVIATE_WRITE_TIMEOUT),
+                ),
+            ),
+        )
+
+    async def connect(self):
+        """Open the client, verify readiness and start the keepalive loop."""
+        loop = asyncio.get_running_loop()
+        self.client = await asyncio.wait_for(
+            loop.run_in_executor(self.executor, self._build_client),
+            timeout=settings.WEAVIATE_INIT_TIMEOUT * 2
+        )
+
+        await self._call(lambda: _require_ready(self.client.is_ready()))
+
+        if settings.WEAVIATE_KEEPALIVE_SECONDS > 0:
+            self._keepalive_task = asyncio.create_task(self._keepalive())
+
+    def _ping(self):
+        """Check readiness over HTTP, then touch the gRPC channel with a one-object fetch."""
+        _require_ready(self.client.is_ready())
+        if self.keepalive_collection:
+            self.client.collections.get(self.keepalive_collection).query.fetch_objects(limit=1)
+
+    async def _keepalive(self):
+        """Ping Weaviate periodically to keep the HTTP pool and gRPC channel warm and probe an open circuit."""
+        while True:
+            await asyncio.sleep(settings.WEAVIATE_KEEPALIVE_SECONDS)
+            try:
+                await self.run("keepalive", self._ping, timeout=settings.WEAVIATE_READ_TIMEOUT)
+            except VectorStoreUnavailableError:
+                pass
+            except Exception as e:
+                logger.debug(f"Weaviate keepalive failed: {e}")
+
+    async def _call(self, fn: Callable[[], T]) -> T:
+        """Run a blocking client call on the pool."""
+        def tracked() -> T:
+            try:
+                return fn()
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight -= 1
+
+        with self._in_flight_lock:
+            self._in_flight += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, tracked)
+
+    def _try_acquire_hedge(self) -> bool:
+        """Spend a hedge token if hedging is safe right now.
+
+        Hedging only helps against random slowness; when the server is failing
+        or the pool is busy, a duplicate read just adds load.
+        """
+        if not self.breaker.is_healthy:
+            return False
+        if self._in_flight >= self.workers // 2:
+            return False
+        if self._hedge_tokens < 1:
+            return False
+        self._hedge_tokens -= 1
+        return True
+
+    async def _hedged_call(self, fn: Callable[[], T]) -> T:
+        """Run a read, firing a duplicate if the first is slower than the hedge delay."""
+        self._hedge_tokens = min(
+            settings.WEAVIATE_HEDGE_BURST,
+            self._hedge_tokens + settings.WEAVIATE_HEDGE_BUDGET
+        )
+
+        primary = asyncio.ensure_future(self._call(fn))
+        hedge: Optional[asyncio.Future] = None
+        pending = {primary}
+        error: Optional[BaseException] = None
+
+        try:
+            done, pending = await asyncio.wait(pending, timeout=settings.WEAVIATE_HEDGE_DELAY)
+            if done:
+                return primary.result()
+
+            if not self._try_acquire_hedge():
+                self.hedges_skipped += 1
+                return await primary
+
+            self.hedges_fired += 1
+            hedge = asyncio.ensure_future(self._call(fn))
+            pending.add(hedge)
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def run(
+        self,
+        operation: str,
+        fn: Callable[[], T],
+        timeout: Optional[float] = None,
+        retries: int = 0,
+        hedge: bool = False
+    ) -> T:
+        """Run a client call with a deadline, optional retries and hedging.
+
+        Only pass `retries` or `hedge` for idempotent reads; writes must run
+        at most once. Only transient errors are retried and counted by the
+        breaker. Raises VectorStoreUnavailableError while the circuit is open
+        so callers fail fast instead of waiting on a struggling server.
+        """
+        if self.client is None:
+            raise VectorStoreUnavailableError("Weaviate client is not connected")
+
+        deadline = timeout or settings.WEAVIATE_READ_TIMEOUT
+
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                raise VectorStoreUnavailableError(
+                    f"Weaviate circuit open, refusing {operation}: {self.breaker.last_error}"
+                )
+
+            try:
+                call = self._hedged_call(fn) if hedge else self._call(fn)
+                result = await asyncio.wait_for(call, timeout=deadline)
+                self.breaker.record_success()
+                return result
+
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f"{operation} exceeded {deadline}s deadline")
+
+                if not is_transient(e):
+                    # The server answered; the request itself is at fault
+                    self.breaker.record_success()
+                    raise e
+
+                self.breaker.record_failure(e)
+
+                if attempt >= retries:
+                    raise e
+
+                # Full jitter keeps concurrent retries from synchronising
+                backoff = random.uniform(0, settings.WEAVIATE_RETRY_BACKOFF * (2 ** attempt))
+                logger.debug(f"Retrying {operation} in {backoff:.3f}s after: {e}")
+                await asyncio.sleep(backoff)
+
+    def health(self) -> Dict[str, Any]:
+        """Get connection health for the health endpoint."""
+        if self.client is None:
+            status = "unavailable"
+        elif self.breaker.is_healthy:
+            status = "healthy"
+        else:
+            status = "degraded"
+
+        return {
+            "status": status,
+            "circuit": self.breaker.status(),
+            "in_flight": self._in_flight,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedges_skipped": self.hedges_skipped,
+        }
+
+    async def close(self):
+        """Stop the keepalive loop, close the client and shut down the pool."""
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        if self.client:
+            self.client.close()
+            self.client = None
+        self.executor.shutdown(wait=False)
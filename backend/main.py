@@ -10,6 +10,8 @@ from app.config import settings
 from app.api.routes import api_router
 from app.services.vector_store import VectorStoreService
 from app.services.llm_adapter import LLMAdapterService
+from app.services.context_packer import ContextPacker
+from app.services.branch_prefetch import BranchPrefetchService
 
 # Load environment variables
 load_dotenv()
@@ -26,8 +28,16 @@ async def lifespan(app: FastAPI):
         await vector_store.initialize()
         app.state.vector_store = vector_store
         
+        # Initialize context packer
+        context_packer = ContextPacker()
+        app.state.context_packer = context_packer
+        
+        # Initialize branch context prefetch
+        branch_prefetch = BranchPrefetchService(vector_store, context_packer)
+        app.state.branch_prefetch = branch_prefetch
+        
         # Initialize LLM adapter
-        llm_adapter = LLMAdapterService()
+        llm_adapter = LLMAdapterService(prefetcher=branch_prefetch)
         app.state.llm_adapter = llm_adapter
         
         logger.info("All services initialized successfully")
@@ -40,6 +50,8 @@ async def lifespan(app: FastAPI):
     
     # Cleanup
     logger.info("Shutting down Entropy backend...")
+    if hasattr(app.state, 'branch_prefetch'):
+        await app.state.branch_prefetch.close()
     if hasattr(app.state, 'vector_store'):
         await app.state.vector_store.close()
 
@@ -84,7 +96,14 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "service": "entropy-backend"}
+    vector_store = getattr(app.state, "vector_store", None)
+    vector_store_status = vector_store.health()["status"] if vector_store else "unavailable"
+    
+    return {
+        "status": "healthy" if vector_store_status == "healthy" else "degraded",
+        "service": "entropy-backend",
+        "vector_store": vector_store_status
+    }
 
 if __name__ == "__main__":
     import uvicorn
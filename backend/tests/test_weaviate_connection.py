@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from weaviate.exceptions import UnexpectedStatusCodeError
+
+from app.config import settings
+from app.services.weaviate_connection import (
+    CircuitBreaker,
+    VectorStoreUnavailableError,
+    WeaviateConnection,
+    is_transient,
+)
+
+class FakeCall:
+    """Blocking callable that sleeps and then returns or raises, counting invocations."""
+
+    def __init__(self, delays=(0.0,), error=None, result="ok"):
+        self.delays = list(delays)
+        self.error = error
+        self.result = result
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        time.sleep(self.delays[min(index, len(self.delays) - 1)])
+        if self.error is not None:
+            raise self.error
+        return f"{self.result}-{index}"
+
+def unprocessable_entity() -> UnexpectedStatusCodeError:
+    response = httpx.Response(
+        422,
+        json={"error": [{"message": "invalid filter"}]},
+        request=httpx.Request("POST", "http://localhost:8080/v1/graphql"),
+    )
+    return UnexpectedStatusCodeError("Query failed", response)
+
+@pytest.fixture
+def connection(monkeypatch):
+    monkeypatch.setattr(settings, "WEAVIATE_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(settings, "WEAVIATE_BREAKER_RESET_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "WEAVIATE_READ_TIMEOUT", 1.0)
+    monkeypatch.setattr(settings, "WEAVIATE_RETRY_BACKOFF", 0.001)
+    monkeypatch.setattr(settings, "WEAVIATE_HEDGE_DELAY", 0.02)
+    monkeypatch.setattr(settings, "WEAVIATE_HEDGE_BUDGET", 0.0)
+    monkeypatch.setattr(settings, "WEAVIATE_HEDGE_BURST", 5.0)
+
+    conn = WeaviateConnection()
+    # Any non-None client marks the connection as open; calls go through FakeCall
+    conn.client = object()
+    yield conn
+    conn.executor.shutdown(wait=False)
+
+def test_breaker_opens_after_consecutive_timeouts(connection):
+    slow = FakeCall(delays=(0.2,))
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(TimeoutError):
+                await connection.run("search", slow, timeout=0.02)
+        with pytest.raises(VectorStoreUnavailableError):
+            await connection.run("search", slow, timeout=0.02)
+
+    asyncio.run(scenario())
+
+    assert connection.breaker.state == CircuitBreaker.OPEN
+    assert slow.calls == 3
+    assert connection.health()["status"] == "degraded"
+
+def test_half_open_lets_exactly_one_probe_through(connection):
+    for _ in range(3):
+        connection.breaker.record_failure(TimeoutError("deadline"))
+    probe = FakeCall(delays=(0.05,))
+
+    async def scenario():
+        await asyncio.sleep(0.06)
+        return await asyncio.gather(
+            *[connection.run("search", probe) for _ in range(4)],
+            return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+
+    assert probe.calls == 1
+    assert sum(isinstance(r, VectorStoreUnavailableError) for r in results) == 3
+    assert connection.breaker.state == CircuitBreaker.CLOSED
+
+def test_cancelled_probe_releases_half_open_slot(connection):
+    for _ in range(3):
+        connection.breaker.record_failure(TimeoutError("deadline"))
+
+    async def scenario():
+        await asyncio.sleep(0.06)
+        probe = asyncio.ensure_future(connection.run("search", FakeCall(delays=(0.2,))))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await connection.run("search", FakeCall())
+
+    assert asyncio.run(scenario()) == "ok-0"
+    assert connection.breaker.state == CircuitBreaker.CLOSED
+
+def test_non_transient_error_neither_retries_nor_trips_breaker(connection):
+    bad_request = FakeCall(error=unprocessable_entity())
+
+    async def scenario():
+        for _ in range(5):
+            with pytest.raises(UnexpectedStatusCodeError):
+                await connection.run("search", bad_request, retries=2)
+
+    asyncio.run(scenario())
+
+    assert bad_request.calls == 5
+    assert connection.breaker.state == CircuitBreaker.CLOSED
+    assert connection.breaker.consecutive_failures == 0
+
+def test_is_transient_follows_cause_chain():
+    try:
+        try:
+            raise TimeoutError("read timed out")
+        except TimeoutError as e:
+            raise RuntimeError("query failed") from e
+    except RuntimeError as wrapped:
+        assert is_transient(wrapped)
+
+    assert not is_transient(ValueError("bad filter"))
+    assert not is_transient(unprocessable_entity())
+
+def test_hedged_read_returns_faster_duplicate(connection):
+    read = FakeCall(delays=(0.3, 0.0))
+
+    result = asyncio.run(connection.run("search", read, hedge=True))
+
+    assert result == "ok-1"
+    assert connection.hedges_fired == 1
+    assert connection.hedges_won == 1
+
+def test_hedged_read_raises_when_both_attempts_fail(connection):
+    failing = FakeCall(delays=(0.05,), error=ConnectionError("refused"))
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(connection.run("search", failing, hedge=True))
+
+    assert failing.calls == 2
+    assert connection.hedges_fired == 1
+
+def test_no_hedge_without_budget(connection, monkeypatch):
+    monkeypatch.setattr(settings, "WEAVIATE_HEDGE_BURST", 0.0)
+    connection._hedge_tokens = 0.0
+    read = FakeCall(delays=(0.05,))
+
+    result = asyncio.run(connection.run("search", read, hedge=True))
+
+    assert result == "ok-0"
+    assert read.calls == 1
+    assert connection.hedges_fired == 0
+    assert connection.hedges_skipped == 1
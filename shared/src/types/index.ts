@@ -67,6 +67,7 @@ export const ContextSchema = z.object({
 
 // Branch creation request
 export const BranchRequestSchema = z.object({
+  branchId: z.string().optional(), // Client-created branch id; keys the backend context prefetch
   selectedText: z.string(),
   sourceMessageId: z.string(),
   sourceThreadId: z.string(),